@@ -3,14 +3,37 @@ Find craters that lie within other craters.
 """
 import numpy as np
 import pandas as pd
-import time
+import argparse
 import json
+import os
 
 from collections import defaultdict
+from numba import njit, prange
+from scipy.spatial import cKDTree
+from tqdm import tqdm
 
 # https://nssdc.gsfc.nasa.gov/planetary/factsheet/moonfact.html
 MOON_MEAN_RADIUS = 1737.4  # km
 
+# Children passed per _containment_kernel call
+CHUNK_SIZE = 16384
+
+# Bytes of child x parent cosines parents_matmul works on at once, sized to
+# stay in a typical L3 cache
+CACHE_BYTES = 8 * 1024 * 1024
+
+# Chord length on the unit sphere (~17 m on the Moon) added to the float32
+# thresholds of _containment_kernel so rounding can't lose a parent
+FLOAT32_CHORD_SLACK = 1e-5
+
+# Subtracted from the float32 cosine thresholds of parents_matmul, about 8
+# float32 ulps near 1 to cover rounding in a dot product of unit vectors
+FLOAT32_COS_SLACK = 5e-7
+
+# Default locations of the databases, as saved by download-data.py
+ROBBINS_FILENAME = "./lunar_crater_database_robbins_2018.csv"
+YANG_FILENAME = "./yang_aged_database.csv"
+
 
 def correct_lon_column(df, lon_name):
     """
@@ -21,15 +44,8 @@ def correct_lon_column(df, lon_name):
     df: Pandas dataframe
     name: Name of column in the dataframe
     """
-
-    def bool_to_deg(x):
-        if x:
-            return 360
-        return 0
-
     neg_lon = df[lon_name] < 0
-    lon_correct_factor = [bool_to_deg(i) for i in neg_lon]
-    df[lon_name] = df[lon_name] + lon_correct_factor
+    df[lon_name] = df[lon_name] + 360 * neg_lon
 
 
 def great_cirlce_distance(a_lon, a_lat, b_lon, b_lat, radius=MOON_MEAN_RADIUS):
@@ -43,84 +59,426 @@ def great_cirlce_distance(a_lon, a_lat, b_lon, b_lat, radius=MOON_MEAN_RADIUS):
     b_lon = np.deg2rad(b_lon)
     b_lat = np.deg2rad(b_lat)
 
-    angle = np.arccos(
-        np.sin(a_lat) * np.sin(b_lat)
-        + np.cos(a_lat) * np.cos(b_lat) * np.cos(a_lon - b_lon)
+    # Haversine formula, unlike arccos of the cosine it stays accurate for
+    # points that are close together
+    hav = (
+        np.sin((b_lat - a_lat) / 2) ** 2
+        + np.cos(a_lat) * np.cos(b_lat) * np.sin((b_lon - a_lon) / 2) ** 2
     )
+    angle = 2 * np.arcsin(np.sqrt(np.clip(hav, 0, 1)))
     return angle * radius
 
 
-def crater_in_crater(c_lon, c_lat, p_lon, p_lat, p_diam):
+def lonlat_to_xyz(lon, lat):
+    """
+    Convert lon/lat to Cartesian coordinates on the unit sphere.
+
+    Assumes lon/lat is passed in degrees.
+
+    Returns: Array with a trailing axis of length 3 (x, y, z).
+    """
+    lon = np.deg2rad(lon)
+    lat = np.deg2rad(lat)
+    return np.stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1
+    )
+
+
+def chord_radius(diam, radius=MOON_MEAN_RADIUS):
+    """
+    Straight-line distance on the unit sphere spanned by a crater's radius.
+
+    A point lies within the crater iff its unit vector is closer than this to
+    the unit vector of the crater's center.
+    """
+    return 2 * np.sin(diam / (4 * radius))
+
+
+def chord_sq(a_xyz, b_xyz):
     """
-    Check if child crater c lies within parent crater p.
+    Squared straight-line distance between unit-sphere coordinates.
+
+    Grows monotonically with the great circle distance, so it can stand in
+    for it when comparing against chord_radius(diam) ** 2.
     """
-    dist = great_cirlce_distance(c_lon, c_lat, p_lon, p_lat)
-    return dist < p_diam / 2  # Use radius not diameter...
+    return np.sum((a_xyz - b_xyz) ** 2, axis=-1)
 
 
-def crater_in_ncraters(c_lon, c_lat, p_df):
+def crater_in_ncraters(c_xyz, p_xyz, p_chord_sq, p_id):
     """
     Find if child crater c lies within one of many parent craters.
 
-    p_df has the colums: ["id", "lon", "lat", "diam"]
+    c_xyz and p_xyz are unit-sphere coordinates (see lonlat_to_xyz),
+    p_chord_sq is chord_radius(p_diam) ** 2 and p_id the parent IDs. All
+    parents are checked at once.
 
     Returns: ID of parent crater child crater lies within or None.
     """
-    for p_crater in p_df.itertuples():
-        if crater_in_crater(c_lon, c_lat, p_crater.lon, p_crater.lat, p_crater.diam):
-            return p_crater.id
+    hits = np.flatnonzero(chord_sq(c_xyz, p_xyz) < p_chord_sq)
+    if len(hits):
+        return p_id[hits[0]]
     return None
 
 
-def ncraters_in_ncraters(c_df, p_df, progress=False):
+def crater_arrays(df, dtype=np.float64):
     """
-    Check if craters in child_df are in parent_df.
+    Pull the columns of a crater dataframe out into contiguous arrays.
 
-    Both input dataframes have the columns: ["id", "lon", "lat", "diam"]
+    df: Pandas dataframe with the columns: ["id", "lon", "lat", "diam"]
+
+    Returns: Dict with "id", "lon", "lat" and "diam" arrays, lon/lat/diam
+    cast to dtype. Also holds the unit-sphere coordinates as "xyz" and
+    chord_radius(diam) ** 2 as "chord_sq", so the containment methods don't
+    each recompute them.
+    """
+    arrays = {"id": df["id"].to_numpy()}
+    for name in ["lon", "lat", "diam"]:
+        arrays[name] = np.ascontiguousarray(df[name].to_numpy(), dtype=dtype)
+    arrays["xyz"] = lonlat_to_xyz(arrays["lon"], arrays["lat"])
+    arrays["chord_sq"] = chord_radius(arrays["diam"]) ** 2
+    return arrays
+
+
+def parents_kdtree(children, parents, progress=False):
+    """
+    Find the first parent crater each child crater lies within.
+
+    Parents are indexed in a KD-tree on their unit-sphere coordinates so each
+    child is only checked against the parents close enough to contain it.
+
+    Returns: Array of parent indices, -1 where a child has no parent.
+    """
+    c_xyz = children["xyz"]
+    p_xyz, p_chord_sq = parents["xyz"], parents["chord_sq"]
+
+    p_tree = cKDTree(p_xyz)
+    max_chord = np.sqrt(p_chord_sq.max())
+    p_ind = np.arange(len(p_xyz))
+
+    parent_idx = np.full(len(c_xyz), -1, dtype=np.int32)
+
+    for c_ind in tqdm(range(len(c_xyz)), disable=not progress):
+        # Candidates come back unordered, keep the first match in parent order
+        candidates = sorted(p_tree.query_ball_point(c_xyz[c_ind], max_chord))
+        hit = crater_in_ncraters(
+            c_xyz[c_ind], p_xyz[candidates], p_chord_sq[candidates], p_ind[candidates]
+        )
+        if hit is not None:
+            parent_idx[c_ind] = hit
+
+    return parent_idx
 
-    Has the side effect of adding a new column to parent_df called
-    "children_ids", the set of IDs of child craters.
+
+def parents_matmul(children, parents, progress=False, chunk_size=None):
     """
-    overlaps = defaultdict(set)
+    Find the first parent crater each child crater lies within.
+
+    Children are checked against every parent in chunks, the cosine of the
+    angle between each child and parent center is the dot product of their
+    unit vectors so a whole chunk is a single matrix multiply.
+
+    The float32 parent table is built once and stays in cache while the
+    children stream through it. chunk_size defaults to as many children as
+    keep the chunk's cosines within CACHE_BYTES. The float32 thresholds are
+    widened by FLOAT32_COS_SLACK and the matches verified in float64.
 
-    c_ind = 0
-    t_start = time.perf_counter()
+    Returns: Array of parent indices, -1 where a child has no parent.
+    """
+    c_xyz = children["xyz"]
+    p_xyz_32 = parents["xyz"].astype(np.float32)
+    # Inside the parent iff the cosine is above that of its angular radius,
+    # cos(angle) = 1 - chord ** 2 / 2
+    cos_thr_32 = (1 - parents["chord_sq"] / 2 - FLOAT32_COS_SLACK).astype(np.float32)
+
+    if chunk_size is None:
+        chunk_size = max(1, CACHE_BYTES // (p_xyz_32.itemsize * len(p_xyz_32)))
+
+    n_c = len(c_xyz)
+    parent_idx = np.full(n_c, -1, dtype=np.int32)
+
+    with tqdm(total=n_c, disable=not progress) as progress_bar:
+        for start in range(0, n_c, chunk_size):
+            stop = min(start + chunk_size, n_c)
+            c_xyz_32 = c_xyz[start:stop].astype(np.float32)
+            inside = c_xyz_32 @ p_xyz_32.T > cos_thr_32
+            # argmax finds the first True, but is also 0 when there are none
+            first = np.argmax(inside, axis=1)
+            parent_idx[start:stop] = np.where(inside.any(axis=1), first, -1)
+            progress_bar.update(stop - start)
+
+    verify_parents(children, parents, parent_idx)
+    return parent_idx
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _containment_kernel(c_lon, c_lat, p_lon, p_lat, p_chord_sq):
+    """
+    Compiled brute force search for the first parent containing each child.
 
-    for c_crater in c_df.itertuples():
-        parent_id = crater_in_ncraters(c_crater.lon, c_crater.lat, p_df)
-        if parent_id:
-            # return(parent_id, c_crater.id)
-            overlaps[parent_id].add(c_crater.id)
+    Assumes lon/lat is passed in degrees. Compares squared chord lengths on
+    the unit sphere against p_chord_sq, so the inner loop needs no trig at
+    all. Parents are first pruned on latitude alone, which rejects nearly all
+    of them with a single subtraction.
 
-        if progress and c_ind % 1000 == 1:
-            percent = c_ind / len(c_df) * 100
-            t_elapsed = time.perf_counter() - t_start
-            rate = t_elapsed / percent
-            t_est = (100 - percent) * rate
-            print(
-                f"{c_ind}/{len(c_df)}, {percent:.1f}, elapsed: {t_elapsed:.0f}, eta: {t_est:.0f}"
+    All trig happens up front in whole-array expressions with no early exit,
+    which fastmath lets LLVM vectorize (through Intel SVML when numba finds
+    it, e.g. with icc_rt installed).
+    """
+    c_lon = np.deg2rad(c_lon)
+    c_lat = np.deg2rad(c_lat)
+    p_lon = np.deg2rad(p_lon)
+    p_lat = np.deg2rad(p_lat)
+    c_x = np.cos(c_lat) * np.cos(c_lon)
+    c_y = np.cos(c_lat) * np.sin(c_lon)
+    c_z = np.sin(c_lat)
+    p_x = np.cos(p_lat) * np.cos(p_lon)
+    p_y = np.cos(p_lat) * np.sin(p_lon)
+    p_z = np.sin(p_lat)
+    # Angular radius matching p_chord_sq
+    p_ang = 2 * np.arcsin(np.sqrt(p_chord_sq) / 2)
+
+    parent_idx = np.full(len(c_lon), -1, dtype=np.int32)
+
+    for i in prange(len(c_lon)):
+        for j in range(len(p_lon)):
+            # Parents further away in latitude alone can't contain the child
+            if abs(c_lat[i] - p_lat[j]) >= p_ang[j]:
+                continue
+            dist_sq = (
+                (c_x[i] - p_x[j]) ** 2 + (c_y[i] - p_y[j]) ** 2 + (c_z[i] - p_z[j]) ** 2
             )
-        c_ind += 1
+            if dist_sq < p_chord_sq[j]:
+                parent_idx[i] = j
+                break
 
-    return overlaps
+    return parent_idx
 
 
-def build_processed_craters():
+def verify_parents(children, parents, parent_idx):
+    """
+    Re-check parent_idx found by a low precision search in float64.
+
+    The search must have used a threshold loose enough to never miss a
+    parent. Children whose match does not hold up are searched again against
+    every parent.
+
+    children, parents: Outputs of crater_arrays.
+
+    Has the side effect of modifying the passed in parent_idx.
+    """
+    p_xyz, p_chord_sq = parents["xyz"], parents["chord_sq"]
+    p_ind = np.arange(len(p_xyz))
+
+    hits = np.flatnonzero(parent_idx >= 0)
+    c_xyz = children["xyz"][hits]
+
+    found = parent_idx[hits]
+    wrong = chord_sq(c_xyz, p_xyz[found]) >= p_chord_sq[found]
+    for c_ind, xyz in zip(hits[wrong], c_xyz[wrong]):
+        hit = crater_in_ncraters(xyz, p_xyz, p_chord_sq, p_ind)
+        parent_idx[c_ind] = -1 if hit is None else hit
+
+
+def parents_numba(children, parents, progress=False, chunk_size=CHUNK_SIZE):
+    """
+    Find the first parent crater each child crater lies within.
+
+    Runs _containment_kernel across all cores in float32, children are passed
+    in chunks only so progress can be reported. The float32 thresholds are
+    widened by FLOAT32_CHORD_SLACK and the matches verified in float64.
+
+    Returns: Array of parent indices, -1 where a child has no parent.
+    """
+    c_lon, c_lat = children["lon"], children["lat"]
+    p_lon, p_lat, p_diam = parents["lon"], parents["lat"], parents["diam"]
+
+    c_lon_32 = c_lon.astype(np.float32)
+    c_lat_32 = c_lat.astype(np.float32)
+    p_lon_32 = p_lon.astype(np.float32)
+    p_lat_32 = p_lat.astype(np.float32)
+    p_chord_sq_32 = ((chord_radius(p_diam) + FLOAT32_CHORD_SLACK) ** 2).astype(
+        np.float32
+    )
+
+    n_c = len(c_lon)
+    parent_idx = np.full(n_c, -1, dtype=np.int32)
+
+    with tqdm(total=n_c, disable=not progress) as progress_bar:
+        for start in range(0, n_c, chunk_size):
+            stop = min(start + chunk_size, n_c)
+            parent_idx[start:stop] = _containment_kernel(
+                c_lon_32[start:stop],
+                c_lat_32[start:stop],
+                p_lon_32,
+                p_lat_32,
+                p_chord_sq_32,
+            )
+            progress_bar.update(stop - start)
+
+    verify_parents(children, parents, parent_idx)
+    return parent_idx
+
+
+def parents_grid(children, parents, progress=False, cell_size=None):
+    """
+    Find the first parent crater each child crater lies within.
+
+    Parents are binned into a uniform lon/lat grid, each one in every cell
+    its bounding box overlaps, so a child only needs checking against the
+    parents in its own cell. Parents reaching over a pole cover every
+    longitude of their rows. Children sharing a cell are checked together.
+
+    cell_size: Grid spacing in degrees, defaults to the angular diameter of
+    the largest parent.
+
+    Returns: Array of parent indices, -1 where a child has no parent.
+    """
+    c_xyz = children["xyz"]
+    p_lon, p_lat = parents["lon"] % 360, parents["lat"]
+    p_xyz, p_chord_sq = parents["xyz"], parents["chord_sq"]
+    # Angular radius
+    p_ang = np.rad2deg(parents["diam"] / (2 * MOON_MEAN_RADIUS))
+
+    if cell_size is None:
+        cell_size = 2 * p_ang.max()
+    # Round the spacing so whole cells tile both axes
+    n_lon = int(np.ceil(360 / cell_size))
+    n_lat = int(np.ceil(180 / cell_size))
+    lon_step = 360 / n_lon
+    lat_step = 180 / n_lat
+
+    def lat_row(lat):
+        return np.clip(((lat + 90) // lat_step).astype(int), 0, n_lat - 1)
+
+    def lon_col(lon):
+        return (lon // lon_step).astype(int)
+
+    # Half width in longitude of each parent, a parent covers a pole when
+    # sin(ang) >= cos(lat)
+    sin_ang = np.sin(np.deg2rad(p_ang))
+    cos_lat = np.cos(np.deg2rad(p_lat))
+    polar = sin_ang >= cos_lat
+    d_lon = np.rad2deg(
+        np.arcsin(np.where(polar, 1, sin_ang / np.maximum(cos_lat, sin_ang)))
+    )
+
+    row_lo, row_hi = lat_row(p_lat - p_ang), lat_row(p_lat + p_ang)
+    col_lo, col_hi = lon_col(p_lon - d_lon), lon_col(p_lon + d_lon)
+
+    bins = defaultdict(list)
+    for p_ind in range(len(p_lon)):
+        if polar[p_ind] or col_hi[p_ind] - col_lo[p_ind] + 1 >= n_lon:
+            cols = range(n_lon)
+        else:
+            cols = [col % n_lon for col in range(col_lo[p_ind], col_hi[p_ind] + 1)]
+        for row in range(row_lo[p_ind], row_hi[p_ind] + 1):
+            for col in cols:
+                bins[row * n_lon + col].append(p_ind)
+    # Parents were added in order, so each bin is already sorted
+    bins = {cell: np.array(p_inds) for cell, p_inds in bins.items()}
+
+    c_cell = lat_row(children["lat"]) * n_lon + np.minimum(
+        lon_col(children["lon"] % 360), n_lon - 1
+    )
+    order = np.argsort(c_cell, kind="stable")
+    cells, starts = np.unique(c_cell[order], return_index=True)
+
+    n_c = len(c_xyz)
+    parent_idx = np.full(n_c, -1, dtype=np.int32)
+
+    with tqdm(total=n_c, disable=not progress) as progress_bar:
+        for cell, group in zip(cells, np.split(order, starts[1:])):
+            progress_bar.update(len(group))
+            candidates = bins.get(cell)
+            if candidates is None:
+                continue
+
+            # Keep each block's child x candidate differences within CACHE_BYTES
+            block_size = max(1, CACHE_BYTES // (3 * c_xyz.itemsize * len(candidates)))
+            for start in range(0, len(group), block_size):
+                block = group[start : start + block_size]
+                inside = (
+                    chord_sq(c_xyz[block, None], p_xyz[candidates])
+                    < p_chord_sq[candidates]
+                )
+                # argmax finds the first True, but is also 0 when there are none
+                first = np.argmax(inside, axis=1)
+                parent_idx[block] = np.where(inside.any(axis=1), candidates[first], -1)
+
+    return parent_idx
+
+
+CONTAINMENT_METHODS = {
+    "kdtree": parents_kdtree,
+    "matmul": parents_matmul,
+    "numba": parents_numba,
+    "grid": parents_grid,
+}
+
+
+def ncraters_in_ncraters(c_df, p_df, progress=False, method="kdtree"):
+    """
+    Check if craters in child_df are in parent_df.
+
+    Both input dataframes have the columns: ["id", "lon", "lat", "diam"]
+
+    method: Key of CONTAINMENT_METHODS used to match children to parents,
+    each takes the crater_arrays of the children and the parents.
+
+    Parents are tried largest first, so a child inside several parents is
+    assigned to the largest one, and the methods that stop at the first
+    match get there sooner.
+
+    Returns: Dict mapping parent ID to the set of IDs of child craters.
+    """
+    p_df = p_df.sort_values("diam", ascending=False, kind="stable")
+    children = crater_arrays(c_df)
+    parents = crater_arrays(p_df)
+    c_id = children["id"]
+    p_id = parents["id"]
+
+    parent_idx = CONTAINMENT_METHODS[method](children, parents, progress=progress)
+
+    hits = pd.DataFrame({"cid": c_id, "pidx": parent_idx}).query("pidx >= 0")
+    return {p_id[p_ind]: set(c_ids) for p_ind, c_ids in hits.groupby("pidx")["cid"]}
+
+
+def build_processed_craters(robbins_path=ROBBINS_FILENAME, yang_path=YANG_FILENAME):
     """
     Load and process Yang and Robbins datasets.
 
+    The processed Robbins craters are cached next to robbins_path as
+    "<name>_lt_10.parquet", it is rebuilt whenever the CSV is newer.
+
     Returns: Two dataframes, each with "id", "lon", "lat", and "diam" fields.
     """
-    robbins_craters = pd.read_csv("./lunar_crater_database_robbins_2018.csv")
-    robbins_lt_10 = robbins_craters["DIAM_CIRC_IMG"] < 10
-    robbins_craters = robbins_craters[robbins_lt_10]
-    child_craters = pd.DataFrame()
-    child_craters["id"] = robbins_craters["CRATER_ID"]
-    child_craters["lon"] = robbins_craters["LON_CIRC_IMG"]
-    child_craters["lat"] = robbins_craters["LAT_CIRC_IMG"]
-    child_craters["diam"] = robbins_craters["DIAM_CIRC_IMG"]
-
-    yang_aged_craters = pd.read_csv("./yang_aged_database.csv")
+    robbins_cache = os.path.splitext(robbins_path)[0] + "_lt_10.parquet"
+    # Rebuild if the CSV was replaced since the cache was written
+    cache_is_fresh = os.path.exists(robbins_cache) and (
+        not os.path.exists(robbins_path)
+        or os.path.getmtime(robbins_path) <= os.path.getmtime(robbins_cache)
+    )
+    if cache_is_fresh:
+        child_craters = pd.read_parquet(robbins_cache)
+    else:
+        # Only parse the columns we keep, the full file has dozens more
+        robbins_craters = pd.read_csv(
+            robbins_path,
+            usecols=["CRATER_ID", "LON_CIRC_IMG", "LAT_CIRC_IMG", "DIAM_CIRC_IMG"],
+            dtype={"CRATER_ID": "string", "DIAM_CIRC_IMG": np.float32},
+        )
+        robbins_lt_10 = robbins_craters["DIAM_CIRC_IMG"] < 10
+        robbins_craters = robbins_craters[robbins_lt_10]
+        child_craters = pd.DataFrame()
+        child_craters["id"] = robbins_craters["CRATER_ID"]
+        child_craters["lon"] = robbins_craters["LON_CIRC_IMG"]
+        child_craters["lat"] = robbins_craters["LAT_CIRC_IMG"]
+        child_craters["diam"] = robbins_craters["DIAM_CIRC_IMG"]
+        child_craters.to_parquet(robbins_cache, index=False)
+
+    yang_aged_craters = pd.read_csv(
+        yang_path, usecols=["ID", "Lon", "Lat", "Diam_km", "Age"]
+    )
     parent_craters = pd.DataFrame()
     parent_craters["id"] = yang_aged_craters["ID"]
     parent_craters["lon"] = yang_aged_craters["Lon"]
@@ -143,25 +501,28 @@ def correct_craters_in_craters():
     with open("./robbins_in_yang.json", "r") as file:
         data = json.loads(file.read())
 
+    # Index both by ID once so each parent only looks up its own rows
+    child_by_id = child_craters.set_index("id")
+    parent_by_id = parent_craters.set_index("id")
+
     def list_to_dataframe(p_id, c_list):
-        crater_rows = child_craters["id"].map(lambda x: x in c_list)
-        return child_craters[crater_rows]
+        return child_by_id.loc[c_list]
 
     def craters_in_parent(parent_id, c_list):
         child_df = list_to_dataframe(parent_id, c_list)
 
-        parent_row = parent_craters[parent_craters["id"] == int(parent_id)]
-        parent_radius = float(parent_row["diam"] / 2)
-        parent_lon = float(parent_row["lon"])
-        parent_lat = float(parent_row["lat"])
+        parent_row = parent_by_id.loc[int(parent_id)]
+        parent_radius = parent_row["diam"] / 2
         # Check that the distance between center of the parent and center of
         # each child is actually within the radius of the parent
-        correct_rows = child_df.apply(
-            lambda x: great_cirlce_distance(x["lon"], x["lat"], parent_lon, parent_lat)
-            <= parent_radius,
-            axis=1,
+        dist = great_cirlce_distance(
+            child_df["lon"].to_numpy(),
+            child_df["lat"].to_numpy(),
+            parent_row["lon"],
+            parent_row["lat"],
         )
-        return list(child_df["id"][correct_rows])
+        correct_rows = dist <= parent_radius
+        return list(child_df.index[correct_rows])
 
     new_data = {p_id: craters_in_parent(p_id, c_list) for p_id, c_list in data.items()}
     new_data = {p_id: c_list for p_id, c_list in new_data.items() if len(c_list) > 0}
@@ -170,21 +531,50 @@ def correct_craters_in_craters():
 
 
 def main():
-    parent_craters, child_craters = build_processed_craters()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--robbins", default=ROBBINS_FILENAME, help="Robbins (2018) database CSV"
+    )
+    parser.add_argument(
+        "--yang", default=YANG_FILENAME, help="Yang et al. (2020) aged database CSV"
+    )
+    parser.add_argument(
+        "--method",
+        choices=CONTAINMENT_METHODS,
+        default="kdtree",
+        help="How to match child craters to parent craters",
+    )
+    parser.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="Write robbins_in_yang.ndjson, one parent per line, instead of "
+        "robbins_in_yang.json",
+    )
+    args = parser.parse_args()
 
-    results = ncraters_in_ncraters(child_craters, parent_craters, progress=True)
+    parent_craters, child_craters = build_processed_craters(args.robbins, args.yang)
+
+    results = ncraters_in_ncraters(
+        child_craters, parent_craters, progress=True, method=args.method
+    )
 
     robbins_in_yang = pd.DataFrame()
     yang_ids, robbins_ids = zip(*results.items())
     robbins_in_yang["yang_id"] = yang_ids
     robbins_in_yang["robbins_ids"] = robbins_ids
 
-    with open("robbins_in_yang.csv", "w") as file:
-        file.write(robbins_in_yang.to_csv(index=False))
-
-    robbins_in_yang_no_set = {k: list(v) for k, v in robbins_in_yang.items()}
-    with open("robbins_in_yang.json") as file:
-        file.write(json.dumps(robbins_in_yang_no_set, indent=4))
+    robbins_in_yang.to_csv("robbins_in_yang.csv", index=False)
+
+    if args.ndjson:
+        # One {yang_id: [robbins_ids]} object per line, written as we go
+        with open("robbins_in_yang.ndjson", "w") as file:
+            for yang_id, robbins_ids in results.items():
+                json.dump({str(yang_id): list(robbins_ids)}, file)
+                file.write("\n")
+    else:
+        robbins_in_yang_no_set = {str(k): list(v) for k, v in results.items()}
+        with open("robbins_in_yang.json", "w") as file:
+            json.dump(robbins_in_yang_no_set, file, indent=4)
 
 
 if __name__ == "__main__":
@@ -3,7 +3,11 @@ Little Python script to download the databases
 """
 
 import argparse
-from urllib.request import urlretrieve
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 
 ROBBINS_URL = "https://pdsimage2.wr.usgs.gov/Individual_Investigations/moon_lro.kaguya_multi_craterdatabase_robbins_2018/data/lunar_crater_database_robbins_2018.csv"
 ROBBINS_FILENAME = "lunar_crater_database_robbins_2018.csv"
@@ -11,10 +15,33 @@ ROBBINS_FILENAME = "lunar_crater_database_robbins_2018.csv"
 YANG_URL = "https://figshare.com/ndownloader/files/24160592"
 YANG_FILENAME = "yang_aged_database.csv"
 
+CHUNK_SIZE = 1 << 20  # bytes
+TIMEOUT = 60  # seconds to connect, and between bytes received
+
+
+def download(url, filename):
+    """
+    Stream url to filename without holding the whole file in memory.
+
+    Downloads to filename + ".part" first, so an interrupted download never
+    leaves a truncated file under filename.
+    """
+    part_filename = filename + ".part"
+    with requests.get(url, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        # Let urllib3 undo any Content-Encoding while copying
+        response.raw.decode_content = True
+        with open(part_filename, "wb") as file:
+            shutil.copyfileobj(response.raw, file, length=CHUNK_SIZE)
+    os.replace(part_filename, filename)
+
 
 def main():
-    urlretrieve(YANG_URL, YANG_FILENAME)
-    # urlretrieve(ROBBINS_URL, ROBBINS_FILENAME)
+    urls = [YANG_URL, ROBBINS_URL]
+    filenames = [YANG_FILENAME, ROBBINS_FILENAME]
+    with ThreadPoolExecutor(len(urls)) as executor:
+        # list() so any download error is raised here
+        list(executor.map(download, urls, filenames))
 
 
 if __name__ == "__main__":